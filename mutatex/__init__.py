@@ -1,5 +1,4 @@
 from Bio import PDB
-from six import iteritems
 
 ptm_residues = {"y": "PTR",
                 "p": "TPO",
@@ -14,7 +13,7 @@ ptm_residues = {"y": "PTR",
                 "f": "H3S"}
 len_three2one = len(PDB.Polypeptide.d1_to_index)
 idx=len_three2one
-for k,v in iteritems(ptm_residues):
+for k,v in ptm_residues.items():
     PDB.Polypeptide.d1_to_index[k] = idx
     PDB.Polypeptide.dindex_to_1[idx] = k
 
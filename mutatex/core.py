@@ -25,7 +25,6 @@ import logging as log
 import re
 import numpy as np
 from Bio import PDB
-from six import iteritems
 from mutatex.utils import *
 
 class MutationList(object):
@@ -202,7 +201,7 @@ class EnergyReport:
         header = "\t".join(header_cols)
         fmt=["%15s"] + ["%10f" for f in header_cols]
 
-        for pdb,energies in iteritems(self.energies):
+        for pdb,energies in self.energies.items():
 
             out = [self.residues[pdb]]
 
@@ -626,7 +625,7 @@ class FoldXSuiteVersion4(FoldXVersion):
                         energies[prefix][idx] = [float(tmp[5])]
                 fh.close()
 
-            for k,v in iteritems(energies[prefix]):
+            for k,v in energies[prefix].items():
                 v = np.array(v)
                 energies[prefix][k] = v.reshape((len(mutlist.mutations),
                                       v.shape[0]//len(mutlist.mutations)))
@@ -21,13 +21,13 @@
 
 import numpy as np
 import logging as log
-from six import iteritems
 from Bio import PDB
 from multiprocessing.pool import ThreadPool
 import matplotlib
 import sys
 import os
 import signal
+import stat
 import argparse
 import multiprocessing as mp
 import logging as log
@@ -35,9 +35,74 @@ import shutil
 import re
 import numpy as np
 import tarfile as tar
+import subprocess as sp
 import platform
 import textwrap
 import csv
+import collections
+import functools
+import itertools
+
+_PDB_PARSER = PDB.PDBParser(QUIET=True)
+
+_RE_POSITION = re.compile(r'(?:[A-Z]?[A-Z][0-9]+_?)+\Z')
+
+_RE_NOT_DIGITS = re.compile(r'\D+')
+
+@functools.lru_cache(maxsize=32)
+def _parse_structure_cached(path_abs, mtime):
+    """
+    Parses a PDB file and caches the resulting structure. The modification
+    time is part of the cache key, so that files changed on disk are parsed
+    again. The returned object is shared between callers and should not be
+    modified in place.
+    Parameters
+    ----------
+    path_abs : str
+        absolute path of the PDB file to be read
+    mtime : float
+        modification time of the PDB file
+    Returns
+    ----------
+    structure : ``PDB.Structure`` object
+        structure loaded from the PDB file
+    """
+
+    return _PDB_PARSER.get_structure("structure", path_abs)
+
+def _load_structure(pdb):
+    """
+    Loads a PDB file through the structure cache
+    Parameters
+    ----------
+    pdb : str
+        PDB file name
+    Returns
+    ----------
+    structure : ``PDB.Structure`` object
+        shared structure loaded from the PDB file
+    """
+
+    path_abs = os.path.abspath(pdb)
+    return _parse_structure_cached(path_abs, os.stat(path_abs).st_mtime)
+
+# arguments common to several mutatex scripts, as used by init_arguments:
+# name: (positional arguments, keyword arguments) of ``add_argument``
+_ARG_SPECS = {
+    'pdb' :           (("-p","--pdb"), dict(dest="in_pdb", help="Input PDB file", required=True)),
+    'data' :          (("-d","--data-directory"), dict(dest="ddg_dir", type=str, help="Input DDG data directory", required=True)),
+    'mutation_list' : (("-l","--mutation-list"), dict(dest="mutation_list",  help="MutateX mutation list file", required=True)),
+    'position_list' : (("-q","--position-list"), dict(dest="position_list",  help="MutateX position list file", default=None)),
+    'multimers' :     (("-M","--multimers"), dict(dest="multimers", default=True, action='store_false', help="Do not use multimers (default: yes)")),
+    'labels' :        (("-b","--label-list"), dict(dest="labels", help="Residue label list generated by pdb2labels")),
+    'fonts' :         (("-F","--font"), dict(dest='font',action='store', type=str, default=None, help="Use this font for plotting. If this isn't specified, the default font will be used.")),
+    'fontsize' :      (("-f","--fontsize"), dict(dest='fontsize',action='store', type=int, default=8, help="Axis label font size")),
+    'verbose' :       (("-v","--verbose"), dict(dest="verbose", action="store_true", default=False, help="Toggle verbose mode")),
+    'title' :         (("-i","--title"), dict(dest='title', type=str, default=None, help="Title for the output image file")),
+    'color' :         (("-c","--color"), dict(dest='mycolor', type=str, default="black", help="Color used for plotting")),
+    'splice' :        (("-s","--splice"), dict(dest='sv',action='store', type=int, default=20, help="Divide data in multiple plots, use -s residues per plot")),
+    'ddg_cache' :     (("--ddg-cache",), dict(dest='ddg_cache', action='store_true', default=False, help="Save parsed DDG files in binary format (.npy) next to the original files and read them from there in later runs")),
+}
 
 def init_arguments(arguments, parser):
     """
@@ -58,42 +123,23 @@ def init_arguments(arguments, parser):
     assert len(set(arguments)) == len(arguments)
 
     for arg in arguments:
-        if   arg == 'pdb':
-            parser.add_argument("-p","--pdb", dest="in_pdb", help="Input PDB file", required=True)
-        elif arg == 'data':
-            parser.add_argument("-d","--data-directory", dest="ddg_dir", type=str, help="Input DDG data directory", required=True)
-        elif arg == 'mutation_list':
-            parser.add_argument("-l","--mutation-list", dest="mutation_list",  help="MutateX mutation list file", required=True)
-        elif arg == 'position_list':
-            parser.add_argument("-q","--position-list", dest="position_list",  help="MutateX position list file", default=None)
-        elif arg == 'multimers':
-            parser.add_argument("-M","--multimers", dest="multimers", default=True, action='store_false', help="Do not use multimers (default: yes)")
-        elif arg == 'labels':
-            parser.add_argument("-b","--label-list", dest="labels", help="Residue label list generated by pdb2labels")
-        elif arg == 'fonts':
-            parser.add_argument("-F","--font", dest='font',action='store', type=str, default=None, help="Use this font for plotting. If this isn't specified, the default font will be used.")
-        elif arg == 'fontsize':
-            parser.add_argument("-f","--fontsize",dest='fontsize',action='store', type=int, default=8, help="Axis label font size")
-        elif arg == 'verbose':
-            parser.add_argument("-v","--verbose", dest="verbose", action="store_true", default=False, help="Toggle verbose mode")
-        elif arg == 'title':
-            parser.add_argument("-i","--title", dest='title', type=str, default=None, help="Title for the output image file")
-        elif arg == 'color':
-            parser.add_argument("-c","--color", dest='mycolor', type=str, default="black", help="Color used for plotting")
-        elif arg == 'splice':
-            parser.add_argument("-s","--splice", dest='sv',action='store', type=int, default=20, help="Divide data in multiple plots, use -s residues per plot")
-        else:
-            raise NameError
+        spec = _ARG_SPECS.get(arg)
+        if spec is None:
+            raise NameError("unknown argument %s" % arg)
+        parser.add_argument(*spec[0], **spec[1])
 
     return parser
 
+@functools.lru_cache(maxsize=1)
+def _get_font_names():
+    return tuple(f.name for f in matplotlib.font_manager.fontManager.ttflist)
+
 def get_font_list(str=True):
 
-    flist = matplotlib.font_manager.get_fontconfig_fonts()
-    names = [ matplotlib.font_manager.FontProperties(fname=fname).get_name() for fname in flist ]
+    names = list(_get_font_names())
     if not str:
         return names
-    return textwrap.fill(", ".join(sorted(list(set(names)))), width=69)
+    return textwrap.fill(", ".join(sorted(set(names))), width=69)
 
 def set_default_font(font):
     available_fonts = get_font_list()
@@ -104,22 +150,14 @@ def set_default_font(font):
     matplotlib.rcParams['font.sans-serif'] = [ font ]
 
 def parse_label_file(csv_fname, fnames, default_labels):
-    if sys.version_info[0] <= 2:
-        read_format = 'rb'
-    else:
-        read_format = 'r'
-
-    label_dict = {}
-    labels = list(default_labels)
-
     try:
-        with open(csv_fname, read_format) as csvfile:
+        with open(csv_fname, 'r', newline='') as csvfile:
             csv_reader = csv.reader(csvfile, delimiter=',', quotechar='|')
-            for row in csv_reader:
-                if row[0] == 'Residue_name':
-                    continue
-                if row[1] != '':
-                    label_dict[row[0]] = row[1]
+            rows = csv_reader
+            first_row = next(csv_reader, None)
+            if first_row is not None and first_row[0] != 'Residue_name':
+                rows = itertools.chain([first_row], csv_reader)
+            label_dict = { row[0]: row[1] for row in rows if row[1] != '' }
     except IOError:
         log.error("Labels file couldn't be read")
         raise IOError
@@ -127,15 +165,36 @@ def parse_label_file(csv_fname, fnames, default_labels):
         log.error("Labels file couldn't be parsed correctly")
         raise
 
-    for i, fname in enumerate(fnames):
-        try:
-            labels[i] = label_dict[fname]
-        except KeyError:
-            log.warning("label for residue %s not found; it will be skipped" % fname)
+    for fname in [ fname for fname in fnames if fname not in label_dict ]:
+        log.warning("label for residue %s not found; it will be skipped" % fname)
 
-    return labels
+    return [ label_dict.get(fname, default) for fname, default in zip(fnames, default_labels) ]
 
-def parse_ddg_file(fname, reslist=None, full=False):
+def _load_ddg_cache(fname):
+    """
+    Loads the binary cache of a free energy file, if it exists and is
+    strictly newer than the file itself, comparing modification times in
+    nanoseconds. A cache with the same modification time as the file is
+    considered stale, so that files rewritten within the same timestamp
+    tick on filesystems with coarse timestamps are parsed again
+    Parameters
+    ----------
+    fname : str
+        name of the free energy file
+    Returns
+    -------
+    ddgs : read-only memory-mapped ``numpy.array`` or None
+        cached data, or None if no usable cache was found
+    """
+
+    try:
+        if os.stat(fname + '.npy').st_mtime_ns <= os.stat(fname).st_mtime_ns:
+            return None
+        return np.load(fname + '.npy', mmap_mode='r')
+    except:
+        return None
+
+def parse_ddg_file(fname, reslist=None, full=False, cache=False):
     """
     Parser function for free energy file produced by MutateX
     Parameters
@@ -148,19 +207,39 @@ def parse_ddg_file(fname, reslist=None, full=False):
     full : bool
         if True, returns all the fields in the file, otherwise just the averages
         column
+    cache : bool
+        if True, read the data from a binary copy of the file (same name with
+        .npy extension appended) if it is newer than the file, otherwise parse the file
+        and write the binary copy. Data read from the copy is memory-mapped
+        and read-only
     Returns
     -------
-    parser : arguments.ArgumentParser instance or any object with the ``add_argument`` method
-        the same object of the parameter, modified with additional arguments
+    ddgs : ``numpy.array``
+        data of the file, of shape (fields, mutations) if ``full`` is True,
+        or (mutations,) with just the averages otherwise. It is a read-only
+        memory-mapped array if it was read from the cache
     """
-    try:
-        ddgs = np.loadtxt(fname, comments='#').T
-    except:
-        log.error("Couldn't open energy file %s or file in the wrong format" % fname)
-        raise IOError
 
-    if len(ddgs.shape) == 1:
-        ddgs = np.expand_dims(ddgs, 1)
+    ddgs = None
+
+    if cache:
+        ddgs = _load_ddg_cache(fname)
+
+    if ddgs is None:
+        # ndmin=2 always gives a (fields, mutations) array: files with a
+        # single row give (fields, 1), and files with a single column, such
+        # as averages-only files, give (1, mutations)
+        try:
+            ddgs = np.loadtxt(fname, comments='#', ndmin=2).T
+        except:
+            log.error("Couldn't open energy file %s or file in the wrong format" % fname)
+            raise IOError
+
+        if cache:
+            try:
+                np.save(fname + '.npy', ddgs)
+            except:
+                log.warning("Couldn't write cache file %s.npy" % fname)
 
     if reslist is not None:
         if ddgs.shape[1] != len(reslist):
@@ -171,6 +250,43 @@ def parse_ddg_file(fname, reslist=None, full=False):
         return ddgs
     return ddgs[0]
 
+def parse_ddg_dir(ddg_dir, fnames, reslist=None, full=False, n_workers=None, cache=False):
+    """
+    Parses several free energy files produced by MutateX from the same
+    directory, in parallel.
+    Parameters
+    ----------
+    ddg_dir : str
+        directory containing the files to be read
+    fnames : iterable of str
+        names of the files to be read, relative to ``ddg_dir``
+    reslist : iterable of str or None
+        list of the expected mutation residue types. See ``parse_ddg_file``
+    full : bool
+        if True, returns all the fields in the files, otherwise just the
+        averages column
+    n_workers : int or None
+        number of files to be read at the same time. If None, the number
+        of available CPUs is used
+    cache : bool
+        use binary copies of the files. See ``parse_ddg_file``
+    Returns
+    -------
+    ddgs : ``numpy.array``
+        data of the files, stacked along the first axis in the same order
+        as ``fnames``
+    """
+
+    pool = ThreadPool(n_workers)
+
+    try:
+        ddgs = pool.map(lambda fname: parse_ddg_file(os.path.join(ddg_dir, fname), reslist=reslist, full=full, cache=cache), fnames)
+    finally:
+        pool.close()
+        pool.join()
+
+    return np.stack(ddgs)
+
 def parse_poslist_file(fname, unique_residues):
     """
     Parser function for position list files
@@ -188,8 +304,6 @@ def parse_poslist_file(fname, unique_residues):
     """
 
     out = []
-    re_position = '(([A-Z]?[A-Z][0-9]+)_?)+'
-    matcher = re.compile(re_position)
 
     try:
         fh = open(fname, 'r')
@@ -197,31 +311,36 @@ def parse_poslist_file(fname, unique_residues):
         log.error("Couldn't open position list file %s" % fname)
         raise IOError
     for line in fh:
-        if matcher.fullmatch(line.strip()) is None:
+        line = line.strip()
+        if _RE_POSITION.match(line) is None:
             log.error("the position list file is not in the right format")
-            log.error("format error at %s" % line.strip())
+            log.error("format error at %s" % line)
             raise TypeError
-        residue=tuple(line.strip().split("_"))
-
-        numbers = [ re.sub("[^0-9]", "", x) for x in residue ]
+        residue = tuple(line.split("_"))
+
+        # all the identifiers must have the same length and residue number,
+        # and none can be repeated
+        length = len(residue[0])
+        number = _RE_NOT_DIGITS.sub('', residue[0])
+        seen = set()
+        for x in residue:
+            if len(x) != length or x in seen or _RE_NOT_DIGITS.sub('', x) != number:
+                log.error("the position list file is not in the right format")
+                log.error("format error at %s" % line)
+                raise TypeError
+            seen.add(x)
 
-        if len(set([len(x) for x in residue])) != 1 or\
-        len(set(residue)) != len(residue) or\
-        len(set(numbers)) != 1:
-            log.error("the position list file is not in the right format")
-            log.error("format error at %s" % line.strip())
-            raise TypeError
         if residue not in unique_residues:
             pdb_residues_list=[]
             for i in unique_residues:
                 pdb_residues_list.append(set(residue).issubset(set(i)))
             if pdb_residues_list.count(True) != 1:
-                log.error( "%s residue is not written in the right format or it is not contained in pdbfile" % line.strip())
+                log.error( "%s residue is not written in the right format or it is not contained in pdbfile" % line)
                 raise TypeError
 
         out.append(tuple(sorted([s if str.isdigit(s[1]) else s[1:] for s in residue])))
 
-    return list(set(out))
+    return list(dict.fromkeys(out))
 
 def filter_reslist(reslist, ref):
     """
@@ -245,15 +364,25 @@ def filter_reslist(reslist, ref):
     """
 
     filtered_reslist = []
+    added_residues = set()
 
     edited_reslist = [ set([ x[1:] for x in r ]) for r in reslist ]
 
+    # index of the residues in which each position appears, in order
+    pos_index = {}
+    for i, r in enumerate(edited_reslist):
+        for x in r:
+            pos_index.setdefault(x, []).append(i)
+
     for p in ref:
         added = False
-        for i,u in enumerate(reslist):
-            if set(p).issubset(edited_reslist[i]):
-                if not u in filtered_reslist:
+        this_p = set(p)
+        for i in pos_index.get(p[0], []):
+            if this_p.issubset(edited_reslist[i]):
+                u = reslist[i]
+                if u not in added_residues:
                     filtered_reslist.append(u)
+                    added_residues.add(u)
                 added = True
                 break
         if not added:
@@ -283,6 +412,8 @@ def parse_mutlist_file(fname):
         raise IOError
 
     restypes = []
+    seen = set()
+    duplicates = False
 
     for line in fh:
         if line and not line.startswith("#"):
@@ -295,11 +426,14 @@ def parse_mutlist_file(fname):
             if mtype not in PDB.Polypeptide.d1_to_index.keys():
                 log.error("one or more residue types in the mutation list were incorrectly specified")
                 raise TypeError
+            if mtype in seen:
+                duplicates = True
+            seen.add(mtype)
             restypes.append(mtype)
 
     fh.close()
 
-    if len(set(restypes)) != len(restypes):
+    if duplicates:
         log.error("mutation list file contains duplicates")
         raise TypeError
 
@@ -308,6 +442,152 @@ def parse_mutlist_file(fname):
 
     return restypes
 
+def _walk_chains(model, fname):
+    """
+    Walks the chains of a model once and translates each residue to the
+    single-letter code. Unrecognized residues are skipped.
+    Parameters
+    ----------
+    model : ``PDB.Model`` object
+        model whose chains will be walked
+    fname : str
+        name of the PDB file the model comes from, used for logging
+    Returns
+    -------
+    chains : dict
+        chain identifiers as keys, lists of (residue number, residue type)
+        tuples as values
+    """
+
+    chains = {}
+
+    for chain in model:
+        residues = []
+        for residue in chain:
+            try:
+                res_code = PDB.Polypeptide.three_to_one(residue.get_resname())
+            except:
+                log.warning("Residue %s in file %s couldn't be recognized; it will be skipped" % (residue, fname))
+                continue
+            residues.append((residue.get_id()[1], res_code))
+        chains[chain.get_id()] = residues
+
+    return chains
+
+def _chain_sequences(walks, positions=False):
+    """
+    Builds a string per chain from the output of ``_walk_chains``. If the
+    same chain is found in more than one model, the last one is kept.
+    Parameters
+    ----------
+    walks : list of dict
+        output of ``_walk_chains`` for one or more models
+    positions : bool
+        if True, the string is made of the residue numbers rather than of
+        the residue types
+    Returns
+    -------
+    sequences : dict
+        chain identifiers as keys, strings as values
+    """
+
+    sequences = {}
+
+    for chains in walks:
+        for chain_id, residues in chains.items():
+            if positions:
+                sequences[chain_id] = "".join("%d," % r[0] for r in residues)
+            else:
+                sequences[chain_id] = "".join(r[1] for r in residues)
+
+    return sequences
+
+def _collate_chains(sequences, positions=None):
+    """
+    Groups together chains having identical sequences
+    Parameters
+    ----------
+    sequences : dict
+        chain identifiers as keys, sequences as values
+    positions : dict or None
+        chain identifiers as keys, residue numbers as values. If provided,
+        chains with identical sequences are required to have identical
+        residue numbers as well
+    Returns
+    -------
+    collated_chains : list of lists of str
+        groups of chain identifiers
+    """
+
+    collated_chains = _group_chains(sequences)
+
+    if positions is not None and _group_chains(positions) != collated_chains:
+        log.warning("Input amino acid sequence and input position sequence is not identical in multimer.")
+        raise ValueError("The supplied PDB files must have identical positions of sequences")
+
+    return collated_chains
+
+def _group_chains(sequences):
+    """
+    Groups chain identifiers by identical value, with groups sorted by value
+    Parameters
+    ----------
+    sequences : dict
+        chain identifiers as keys, str as values
+    Returns
+    -------
+    groups : list of lists of str
+        groups of chain identifiers
+    """
+
+    groups = collections.defaultdict(list)
+
+    for chain_id, seq in sequences.items():
+        groups[seq].append(chain_id)
+
+    return [ groups[seq] for seq in sorted(groups) ]
+
+def _build_residue_list(walks, sequences, multimers, positions=None):
+    """
+    Builds the list of residues according to the MutateX naming convention
+    from the output of ``_walk_chains``
+    Parameters
+    ----------
+    walks : list of dict
+        output of ``_walk_chains`` for the models to be considered
+    sequences : dict
+        chain identifiers as keys, sequences as values. Used to detect
+        multimers
+    multimers : bool
+        whether to use the multimers mode or not
+    positions : dict or None
+        chain identifiers as keys, residue numbers as values. See
+        ``_collate_chains``
+    Returns
+    -------
+    residue_list : list of tuples
+        list of residues according to the MutateX convention
+    """
+
+    residue_list = []
+
+    if not multimers:
+        for chains in walks:
+            for chain_id, residues in chains.items():
+                for resid, res_code in residues:
+                    residue_list.append(tuple(["%s%s%d" % (res_code, chain_id, resid)]))
+        return residue_list
+
+    for cg in _collate_chains(sequences, positions=positions):
+        # chain identifiers are single characters, so sorting them once is
+        # the same as sorting each residue tuple by chain
+        cg_sorted = sorted(cg)
+        for chains in walks:
+            for resid, res_code in chains[cg[0]]:
+                residue_list.append(tuple("%s%s%d" % (res_code, c, resid) for c in cg_sorted))
+
+    return residue_list
+
 def get_residue_list(infile, multimers=True, get_structure=False):
     """
     Reads a PDB file and returns a list of residus (number, type and chain)
@@ -331,10 +611,13 @@ def get_residue_list(infile, multimers=True, get_structure=False):
 
     """
 
-    parser = PDB.PDBParser()
-
+    # the structure is returned to callers that may modify it, so it is
+    # parsed again rather than taken from the cache
     try:
-        structure = parser.get_structure("structure", infile)
+        if get_structure:
+            structure = _PDB_PARSER.get_structure("structure", infile)
+        else:
+            structure = _load_structure(infile)
     except IOError:
         log.error("couldn't read or parse your PDB file")
         raise IOError
@@ -347,45 +630,14 @@ def get_residue_list(infile, multimers=True, get_structure=False):
         log.error("the input PDB file does not contain any model. Exiting ...")
         raise IOError
 
-    model = models[0]
-
-    residue_list = []
-    sequences = {}
+    if multimers:
+        walks = [ _walk_chains(model, infile) for model in models ]
+    else:
+        walks = [ _walk_chains(models[0], infile) ]
 
-    for chain in model:
-        chain_name = chain.get_id()
-        sequences[chain_name] = ''
-        for residue in chain:
-            try:
-                res_code = PDB.Polypeptide.three_to_one(residue.get_resname())
-            except:
-                log.warning("Residue %s couldn't be recognized; it will be skipped" % residue )
-                continue
-            if not multimers:
-                residue_list.append(tuple(["%s%s%d" % (res_code, chain.get_id(), residue.get_id()[1])]) )
-            else:
-                sequences[chain_name] += res_code
+    sequences = _chain_sequences(walks[:1])
 
-    if multimers:
-        collated_chains = []
-        seq_ids, seqs = list(zip(*list(iteritems(sequences))))
-        seq_ids = np.array(seq_ids)
-        unique_seqs, unique_idxs = np.unique(seqs, return_inverse=True)
-
-        for i in np.unique(unique_idxs):
-            collated_chains.append(seq_ids[unique_idxs == i])
-
-        for cg in collated_chains:
-            for model in structure:
-                for residue in model[cg[0]]:
-                    resid = residue.get_id()[1]
-                    try:
-                        res_code = PDB.Polypeptide.three_to_one(residue.get_resname())
-                    except:
-                        log.warning("Residue %s couldn't be recognized; it will be skipped" % residue)
-                        continue
-                    this_res = tuple(sorted([ "%s%s%d" % (res_code, c, resid) for c in cg ], key=lambda x: x[1]))
-                    residue_list.append(this_res)
+    residue_list = _build_residue_list(walks, sequences, multimers)
 
     if get_structure:
         return residue_list, structure
@@ -412,64 +664,18 @@ def get_foldx_sequence(pdb, multimers=True):
         list of single-letter residue types
     """
 
-    parser = PDB.PDBParser()
-
     try:
-        structure = parser.get_structure("structure", pdb)
+        structure = _load_structure(pdb)
     except:
         log.error("couldn't read or parse your PDB file")
         raise IOError
 
-    residue_list = []
-    sequences = {}
-    positions = {}
+    walks = [ _walk_chains(model, pdb) for model in structure ]
 
-    for model in structure:
-        for chain in model:
-            chain_name = chain.get_id()
-            sequences[chain_name] = ''
-            positions[chain_name] = ''
-            for residue in chain:
-                try:
-                    res_code = PDB.Polypeptide.three_to_one(residue.get_resname())
-                except:
-                    log.warning("Residue %s in file %s couldn't be recognized; it will be skipped" %(residue, pdb))
-                    continue
-                if not multimers:
-                    residue_list.append(tuple(["%s%s%d" % (res_code, chain.get_id(), residue.get_id()[1])]))
-                else:
-                    sequences[chain_name] += res_code
-                    positions[chain_name] += f"{residue.get_id()[1]},"
+    sequences = _chain_sequences(walks)
+    positions = _chain_sequences(walks, positions=True)
 
-    if multimers:
-        collated_chains = []
-        seq_ids, seqs = list(zip(*list(iteritems(sequences))))
-        pos_ids, pos = list(zip(*list(iteritems(positions))))
-        seq_ids = np.array(seq_ids)
-        pos_ids = np.array(pos_ids)
-        
-        unique_seqs, unique_idxs = np.unique(seqs, return_inverse=True)
-        unique_pos, unique_idxp = np.unique(pos, return_inverse=True)
-        
-        if not (unique_idxs == unique_idxp).all():
-            log.warning("Input amino acid sequence and input position sequence is not identical in multimer.")
-            raise ValueError("The supplied PDB files must have identical positions of sequences")
-
-        for i in np.unique(unique_idxs):
-            collated_chains.append(seq_ids[unique_idxs == i])
-
-        for cg in collated_chains:
-            for model in structure:
-                for residue in model[cg[0]]:
-                    resid = residue.get_id()[1]
-                    try:
-                        res_code = PDB.Polypeptide.three_to_one(residue.get_resname())
-                    except:
-                        log.warning("Residue %s in file %s couldn't be recognized; it will be skipped" %(residue, pdb))
-                        continue
-
-                    this_res = tuple(sorted([ "%s%s%d" % (res_code, c, resid) for c in cg ], key=lambda x: x[1]))
-                    residue_list.append(this_res)
+    residue_list = _build_residue_list(walks, sequences, multimers, positions=positions)
 
     return tuple(residue_list)
 
@@ -481,19 +687,16 @@ def safe_makedirs(dirname):
     dirname : str
         name of the directory to be created
     """
-    if os.path.exists(dirname):
+    try:
+        os.makedirs(dirname)
+    except FileExistsError:
         if not os.path.isdir(dirname):
             log.error("%s exists but is not a directory." % dirname)
             raise IOError
-        else:
-            log.warning("directory %s already exists" % dirname)
-            return
-    else:
-        try:
-            os.makedirs(dirname)
-        except:
-            log.error("Could not create directory %s." % dirname )
-            raise IOError
+        log.warning("directory %s already exists" % dirname)
+    except:
+        log.error("Could not create directory %s." % dirname )
+        raise IOError
 
 def safe_cp(source, destination, dolink=True):
     """
@@ -515,11 +718,13 @@ def safe_cp(source, destination, dolink=True):
     else:
         verb = "copy"
 
-    if not os.path.exists(source):
+    try:
+        source_stat = os.stat(source)
+    except OSError:
         log.error("Couldn't %s file %s; no such file or directory" % (verb, source))
         raise IOError
 
-    if not os.path.isfile(source):
+    if not stat.S_ISREG(source_stat.st_mode):
         log.error("Couldn't %s file %s; it is not a file" % (verb, source))
         raise IOError
 
@@ -532,15 +737,14 @@ def safe_cp(source, destination, dolink=True):
             log.error("Couldn't copy file %s to %s" % (source, destination))
             raise IOError
     else:
-        if os.path.exists(destination):
+        try:
+            os.symlink(source, destination)
+        except FileExistsError:
             log.error("Destination file %s already exists; it will not be overwritten by a link" % destination)
             raise IOError
-        else:
-            try:
-                os.symlink(source, destination)
-            except:
-                log.error("Couldn't link file %s to %s" % (source, destination))
-                raise IOError
+        except:
+            log.error("Couldn't link file %s to %s" % (source, destination))
+            raise IOError
 
 def load_structures(pdb, check_models=False):
     """
@@ -556,14 +760,21 @@ def load_structures(pdb, check_models=False):
     Returns
     ----------
     structure : ``PDB.Structure`` object
-        structure loaded from the PDB file
+        structure loaded from the PDB file. With check_models=False the
+        returned structure is cached and shared with later calls, and must
+        not be modified (this includes passing it to ``split_pdb``, which
+        reassigns the parent of its models). With check_models=True a new
+        structure is returned
 
     """
 
-    parser = PDB.PDBParser()
-
+    # check_models modifies the structure, so it is parsed again rather
+    # than taken from the cache
     try:
-        structure = parser.get_structure("structure", pdb)
+        if check_models:
+            structure = _PDB_PARSER.get_structure("structure", pdb)
+        else:
+            structure = _load_structure(pdb)
     except:
         log.error("couldn't read or parse your PDB file")
         raise IOError
@@ -638,7 +849,15 @@ def parallel_foldx_run(foldx_runs, np):
     results : list of (str, bool) tuples
         whether each run has been complete successfully (name and status)
     """
-    pool = ThreadPool(np)
+    # each worker thread just waits for its FoldX subprocess, so threads are
+    # kept rather than processes: runs are updated in place and their
+    # subprocesses are killed at exit by the main process
+    foldx_runs = list(foldx_runs)
+
+    if not foldx_runs:
+        return []
+
+    pool = ThreadPool(min(np, len(foldx_runs)))
 
     result = pool.imap_unordered(foldx_worker, foldx_runs)
 
@@ -671,63 +890,100 @@ def split_pdb(filename, structure, checked, workdir):
     pdb_list = []
 
     writer = PDB.PDBIO()
-    parser = PDB.PDBParser()
+
+    basename = os.path.splitext(os.path.basename(filename))[0]
+    if checked:
+        checked_str = "_checked"
+    else:
+        checked_str = ""
 
     for model in structure:
         tmpstruc = PDB.Structure.Structure('structure')
         tmpstruc.add(model)
         writer.set_structure(tmpstruc)
-        if checked:
-            checked_str = "_checked"
-        else:
-            checked_str = ""
-        writer.save(os.path.join(workdir, "%s_model%d%s.pdb" % (os.path.splitext(os.path.basename(filename))[0], model.id, checked_str)))
-        pdb_list.append("%s_model%d%s.pdb" % (os.path.splitext(os.path.basename(filename))[0], model.id, checked_str))
+        pdb_fname = "%s_model%d%s.pdb" % (basename, model.id, checked_str)
+        writer.save(os.path.join(workdir, pdb_fname))
+        pdb_list.append(pdb_fname)
 
     return pdb_list
 
-def save_energy_file(fname, data, fmt="%.5f", do_avg=True, do_std=False, do_min=False, do_max=False, axis=1):
+def _energy_stats(data, do_avg=True, do_std=False, do_min=False, do_max=False, axis=1):
     """
-    saves mutation energy data to file in the Mutatex format
+    calculates the statistics written to energy files in the Mutatex format
     Parameters
     ----------
-    fname : str
-        file name the data will be written to
-    fmt : str
-        output file format specification - see ``numpy.savetxt`` fmt option
     data : ``numpy.array``
-        data to be written in the file
+        2D array of energy values
     do_avg : bool
-        write column of average values
+        calculate column of average values
     do_std : bool
-        write column of standard deviation values
+        calculate column of standard deviation values
     do_min : bool
-        write column of minimum values
+        calculate column of minimum values
     do_max : bool
-        write column of maximum values
+        calculate column of maximum values
     axis : int
         axis on which average/standard deviation/minimum/maximum will be calculated
+    Returns
+    ----------
+    out : ``numpy.array``
+        array with one column for each requested statistic
+    header : str
+        header line listing the columns of ``out``
     """
 
-    out = []
     header_cols = []
+    columns = []
 
+    # the average is calculated once and reused for the standard deviation,
+    # which gives the same result as np.std
+    if do_avg or do_std:
+        avg = np.mean(data, axis=axis)
     if do_avg:
-        out.append(np.average(data, axis=axis))
         header_cols.append("avg")
+        columns.append(avg)
     if do_std:
-        out.append(np.std(data, axis=axis))
+        dev = data - np.expand_dims(avg, axis)
+        dev *= dev
         header_cols.append("std")
+        columns.append(np.sqrt(np.mean(dev, axis=axis)))
     if do_min:
-        out.append(np.min(data, axis=axis))
         header_cols.append("min")
+        columns.append(np.min(data, axis=axis))
     if do_max:
-        out.append(np.max(data, axis=axis))
         header_cols.append("max")
+        columns.append(np.max(data, axis=axis))
 
-    header = "\t".join(header_cols)
+    out = np.empty((data.shape[1 - axis], len(columns)))
+    for i, column in enumerate(columns):
+        out[:, i] = column
 
-    out = np.array(out).T
+    return out, "\t".join(header_cols)
+
+def save_energy_file(fname, data, fmt="%.5f", do_avg=True, do_std=False, do_min=False, do_max=False, axis=1):
+    """
+    saves mutation energy data to file in the Mutatex format
+    Parameters
+    ----------
+    fname : str
+        file name the data will be written to
+    fmt : str
+        output file format specification - see ``numpy.savetxt`` fmt option
+    data : ``numpy.array``
+        data to be written in the file
+    do_avg : bool
+        write column of average values
+    do_std : bool
+        write column of standard deviation values
+    do_min : bool
+        write column of minimum values
+    do_max : bool
+        write column of maximum values
+    axis : int
+        axis on which average/standard deviation/minimum/maximum will be calculated
+    """
+
+    out, header = _energy_stats(data, do_avg=do_avg, do_std=do_std, do_min=do_min, do_max=do_max, axis=axis)
 
     try:
         np.savetxt(fname, out, fmt=fmt, header=header)
@@ -758,25 +1014,7 @@ def save_interaction_energy_file(fname, data, fmt="%.5f", do_avg=True, do_std=Fa
         axis on which average/standard deviation/minimum/maximum will be calculated
     """
 
-    out = []
-    header_cols = []
-
-    if do_avg:
-        out.append(np.average(data, axis=axis))
-        header_cols.append("avg")
-    if do_std:
-        out.append(np.std(data, axis=axis))
-        header_cols.append("std")
-    if do_min:
-        out.append(np.min(data, axis=axis))
-        header_cols.append("min")
-    if do_max:
-        out.append(np.max(data, axis=axis))
-        header_cols.append("max")
-
-    header = "\t".join(header_cols)
-
-    out = np.array(out).T
+    out, header = _energy_stats(data, do_avg=do_avg, do_std=do_std, do_min=do_min, do_max=do_max, axis=axis)
 
     try:
         np.savetxt(fname, out, fmt=fmt, header=header)
@@ -805,21 +1043,43 @@ def compress_mutations_dir(cwd, mutations_dirname, mutations_archive_fname='muta
     if not os.path.isdir(cwd):
         log.warning("Directory mutations doesn't exist; it won't be compressed.")
 
+    # use pigz for parallel compression if available, by streaming an
+    # uncompressed tar archive to it
+    pigz = shutil.which('pigz')
+    pigz_proc = None
+
     try:
-        fh = tar.open(archive_path, 'w:gz')
+        if pigz is not None:
+            log.info("pigz will be used for compression")
+            with open(archive_path, 'wb') as archive_fh:
+                pigz_proc = sp.Popen([pigz, '-c'], stdin=sp.PIPE, stdout=archive_fh)
+            fh = tar.open(fileobj=pigz_proc.stdin, mode='w|')
+        else:
+            fh = tar.open(archive_path, 'w:gz')
     except:
         log.warning("Couldn't open compressed file %s for writing." % mutations_archive_fname)
+        if pigz_proc is not None:
+            pigz_proc.kill()
+            pigz_proc.wait()
         return
 
     try:
         fh.add(mutations_dir_path)
+        fh.close()
+        if pigz_proc is not None:
+            pigz_proc.stdin.close()
+            if pigz_proc.wait() != 0:
+                raise IOError
     except:
         log.warning("Couldn't build compressed archive. This step will be skipped.")
-        fh.close()
+        if pigz_proc is not None:
+            pigz_proc.kill()
+            pigz_proc.wait()
+        else:
+            fh.close()
         os.remove(archive_path)
         return
 
-    fh.close()
     log.info("Removing mutations directory ...")
     shutil.rmtree(mutations_dir_path)
     return
@@ -39,7 +39,6 @@ setup(
                        'matplotlib',
 		       'numpy',
                        'scipy',
-                       'six',
                        'openpyxl',
                        'pyyaml',
                        'adjustText>=0.8'],